@@ -0,0 +1,81 @@
+from operations import *
+from routing import club_session
+from transactions import get_transaction_metrics, format_transaction_metrics, reset_transaction_metrics
+from concurrent.futures import ThreadPoolExecutor
+import random
+import sys
+import time as timer
+
+### Contention benchmark: parallel admins assigning rooms
+# Needs the PostgreSQL database seeded by main.py (trainers 101/102, rooms 201/202, member 1).
+# Creates booked-but-unassigned slots on BENCH_DATE, lets N admin threads race to assign random rooms
+# to random slots, then reports throughput and the retry/abort counters from transactions.py.
+# Usage: python bench_contention.py [admins] [assignments_per_admin]
+
+BENCH_DATE = date(2031, 1, 1)
+BENCH_TRAINERS = [101, 102]
+BENCH_ROOMS = [201, 202]
+
+def create_bench_slots(session):
+    slot_ids = []
+    for trainer_id in BENCH_TRAINERS:
+        for hour in range(24):
+            slot = AvailableTime(club_id=DEFAULT_CLUB_ID, trainer_id=trainer_id, date=BENCH_DATE, start_time=hour, member_id=1)
+            session.add(slot)
+            session.flush()
+            session.add(SchedulePT(slot_id=slot.slot_id, club_id=DEFAULT_CLUB_ID, room_id=None))
+            slot_ids.append(slot.slot_id)
+    session.commit()
+    return slot_ids
+
+def remove_bench_slots(session, slot_ids):
+    session.query(SchedulePT).filter(SchedulePT.slot_id.in_(slot_ids)).delete(synchronize_session=False)
+    session.query(AvailableTime).filter(AvailableTime.slot_id.in_(slot_ids)).delete(synchronize_session=False)
+    session.commit()
+
+def admin_worker(slot_ids, assignments, seed):
+    rng = random.Random(seed)
+    session = club_session(DEFAULT_CLUB_ID)
+    outcomes = {'success': 0, 'error': 0}
+    try:
+        for _ in range(assignments):
+            result = assign_room_for_session(session, rng.choice(slot_ids), rng.choice(BENCH_ROOMS))
+            outcomes[result['status']] += 1
+    finally:
+        session.close()
+    return outcomes
+
+if __name__ == '__main__':
+    admins = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    assignments = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    setup_session = club_session(DEFAULT_CLUB_ID)
+    slot_ids = create_bench_slots(setup_session)
+    reset_transaction_metrics()
+
+    try:
+        start = timer.perf_counter()
+        with ThreadPoolExecutor(max_workers=admins) as executor:
+            outcomes = list(executor.map(lambda seed: admin_worker(slot_ids, assignments, seed), range(admins)))
+        elapsed = timer.perf_counter() - start
+
+        # no room may be double-booked at the same hour
+        clashes = setup_session.execute(text("""
+            SELECT COUNT(*) FROM (
+                SELECT s.room_id, a.date, a.start_time FROM schedulept s JOIN availabletime a ON s.slot_id = a.slot_id
+                WHERE s.room_id IS NOT NULL AND a.date = :d
+                GROUP BY s.room_id, a.date, a.start_time HAVING COUNT(*) > 1
+            ) clashes
+        """), {"d": BENCH_DATE}).scalar()
+
+        total = admins * assignments
+        assigned = sum(o['success'] for o in outcomes)
+        metrics = get_transaction_metrics().get('assign_room_for_session', {})
+        print(f"--- {admins} admins x {assignments} assignments in {elapsed:.2f}s ---")
+        print(f"Throughput: {total / elapsed:.1f} operations/s ({assigned} rooms assigned, {total - assigned} rejected)")
+        print(f"Retries: {metrics.get('retries', 0)}, Aborts: {metrics.get('aborts', 0)}, Double bookings: {clashes}")
+        print()
+        print(format_transaction_metrics())
+    finally:
+        remove_bench_slots(setup_session, slot_ids)
+        setup_session.close()
@@ -0,0 +1,103 @@
+from operations import *
+import sys
+import time as timer
+from sqlalchemy import lambda_stmt
+
+### Micro-benchmark: Python-side CPU per call for the hot-path queries
+# Compares building the statements on every call (old behaviour), building them with lambda_stmt(), and the
+# module-level bindparam() statements used by operations.py. Uses an in-memory SQLite database by default so the
+# numbers are dominated by Python work rather than network/server time; pass a database URL to use PostgreSQL.
+# Usage: python bench_statements.py [database_url] [calls]
+
+BENCH_DATE = date(2030, 1, 1)
+BENCH_TABLES = [Club.__table__, Member.__table__, Trainer.__table__, Room.__table__, AvailableTime.__table__, SchedulePT.__table__]
+
+def setup_bench_database(url):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine, tables=BENCH_TABLES)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+    if not session.get(Trainer, 101):
+        session.add(Club(club_id=DEFAULT_CLUB_ID, name='Bench Club'))
+        session.flush()
+        session.add_all([
+            Member(member_id=1, club_id=DEFAULT_CLUB_ID, name='Bench Member', email='bench.member@club.com'),
+            Trainer(trainer_id=101, club_id=DEFAULT_CLUB_ID, name='Bench Trainer', email='bench.trainer@club.com'),
+            Room(room_id=201, club_id=DEFAULT_CLUB_ID, capacity=10),
+        ])
+        session.flush()
+        for hour in range(24):
+            session.add(AvailableTime(slot_id=1000 + hour, club_id=DEFAULT_CLUB_ID, trainer_id=101, date=BENCH_DATE, start_time=hour, member_id=None))
+        session.flush()
+        session.add(SchedulePT(slot_id=1000, club_id=DEFAULT_CLUB_ID, room_id=201))
+        session.commit()
+    return session
+
+# --- old behaviour: a new statement object built (and compiled) per call ---
+def uncached_available_slot(session, hour):
+    stmt = select(AvailableTime).where(
+        AvailableTime.club_id == DEFAULT_CLUB_ID,
+        AvailableTime.trainer_id == 101,
+        AvailableTime.date == BENCH_DATE,
+        AvailableTime.start_time == hour,
+        AvailableTime.member_id.is_(None)
+    )
+    return session.execute(stmt).scalar_one_or_none()
+
+def uncached_room_clash(session, hour):
+    return session.query(SchedulePT).join(AvailableTime).filter(
+        SchedulePT.room_id == 201,
+        AvailableTime.date == BENCH_DATE,
+        AvailableTime.start_time == hour,
+    ).all()
+
+# --- lambda_stmt(): statement cached by the lambda's code location, closure variables tracked per call ---
+def lambda_available_slot(session, hour):
+    return session.execute(lambda_stmt(lambda: select(AvailableTime).where(
+        AvailableTime.club_id == DEFAULT_CLUB_ID,
+        AvailableTime.trainer_id == 101,
+        AvailableTime.date == BENCH_DATE,
+        AvailableTime.start_time == hour,
+        AvailableTime.member_id.is_(None)
+    ))).scalar_one_or_none()
+
+def lambda_room_clash(session, hour):
+    return session.execute(lambda_stmt(lambda: select(SchedulePT).join(AvailableTime).where(
+        SchedulePT.room_id == 201,
+        AvailableTime.date == BENCH_DATE,
+        AvailableTime.start_time == hour,
+    ))).scalars().all()
+
+# --- new behaviour: prebuilt statements from operations.py ---
+def cached_available_slot(session, hour):
+    return session.execute(AVAILABLE_SLOT_STMT, {
+        "club_id": DEFAULT_CLUB_ID, "trainer_id": 101, "slot_date": BENCH_DATE, "start_time": hour
+    }).scalar_one_or_none()
+
+def cached_room_clash(session, hour):
+    return session.execute(ROOM_CLASH_STMT, {"room_id": 201, "slot_date": BENCH_DATE, "start_time": hour}).scalars().all()
+
+def cpu_per_call(session, func, calls):
+    for hour in range(24): # warm up caches
+        func(session, hour)
+    start = timer.process_time()
+    for i in range(calls):
+        func(session, i % 24)
+    return (timer.process_time() - start) / calls * 1e6 # microseconds
+
+if __name__ == '__main__':
+    url = sys.argv[1] if len(sys.argv) > 1 else "sqlite://"
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    session = setup_bench_database(url)
+
+    print(f"--- Python CPU per call over {calls} calls ({url}) ---")
+    print(f"{'Query':<16} | {'Uncached (us)':>13} | {'lambda_stmt (us)':>16} | {'Prebuilt (us)':>13} | {'Reduction':>9}")
+    for name, old, lambda_version, new in [
+        ('available slot', uncached_available_slot, lambda_available_slot, cached_available_slot),
+        ('room clash', uncached_room_clash, lambda_room_clash, cached_room_clash),
+    ]:
+        before = cpu_per_call(session, old, calls)
+        with_lambda = cpu_per_call(session, lambda_version, calls)
+        after = cpu_per_call(session, new, calls)
+        print(f"{name:<16} | {before:>13.1f} | {with_lambda:>16.1f} | {after:>13.1f} | {(1 - after / before) * 100:>8.1f}%")
+    session.close()
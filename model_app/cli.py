@@ -1,12 +1,28 @@
 from operations import *
+import csv
+import uuid
+from routing import club_session, primary_engines
+from transactions import format_transaction_metrics, write_transaction_metrics
+
+# identifies this CLI run as one writer, so its reads see its own writes across sessions (see routing.py)
+CLIENT_ID = uuid.uuid4().hex
 
 ### helper functions
-def get_db_session():
-    engine = create_engine(DATABASE_URL)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
+def get_db_session(club_id=DEFAULT_CLUB_ID):
+    # scoped to one club's shard; writes go to its primary, read_only() blocks may be served by a replica (see routing.py)
+    db = club_session(club_id, client_id=CLIENT_ID)
     return db
 
+def select_club():
+    club_str = input(f"Club ID (leave blank for {DEFAULT_CLUB_ID}): ").strip()
+    if not club_str:
+        return DEFAULT_CLUB_ID
+    try:
+        club_id = int(club_str)
+    except ValueError:
+        return None
+    return club_id if club_id in CLUB_SHARDS else None
+
 def setup_database_schema(engine):
     Base.metadata.create_all(engine)
     with engine.connect() as connection:
@@ -49,20 +65,23 @@ def authenticate_user(session, name, email):
     clear_screen()
     print("--- 👤 Login ---")
 
-    # 1. Check Admin
-    admin_user = session.query(Admin).filter(Admin.name == name, Admin.email == email).first()
-    if admin_user:
-        return ('admin', admin_user)
+    # login lookups are read-only, so they can be served by a replica
+    club_id = current_club(session)
+    with read_only(session):
+        # 1. Check Admin
+        admin_user = session.query(Admin).filter(Admin.club_id == club_id, Admin.name == name, Admin.email == email).first()
+        if admin_user:
+            return ('admin', admin_user)
 
-    # 2. Check Trainer
-    trainer_user = session.query(Trainer).filter(Trainer.name == name, Trainer.email == email).first()
-    if trainer_user:
-        return ('trainer', trainer_user)
+        # 2. Check Trainer
+        trainer_user = session.query(Trainer).filter(Trainer.club_id == club_id, Trainer.name == name, Trainer.email == email).first()
+        if trainer_user:
+            return ('trainer', trainer_user)
 
-    # 3. Check Member
-    member_user = session.query(Member).filter(Member.name == name, Member.email == email).first()
-    if member_user:
-        return ('member', member_user)
+        # 3. Check Member
+        member_user = session.query(Member).filter(Member.club_id == club_id, Member.name == name, Member.email == email).first()
+        if member_user:
+            return ('member', member_user)
 
     return (None, None)
 
@@ -94,7 +113,9 @@ def member_menu(session, user):
                 weight = float(input("Weight (kg): ").strip())
                 height = float(input("Height (cm): ").strip())
                 hr = int(input("Heart Rate (bpm): ").strip())
-                result = log_health_metric(session, user.member_id, weight, height, hr)
+                body_fat_str = input("Body Fat (%, leave blank to skip): ").strip()
+                body_fat = float(body_fat_str) if body_fat_str else None
+                result = log_health_metric(session, user.member_id, weight, height, hr, body_fat)
                 display_result(result)
             except ValueError:
                 display_result({"status": "error", "message": "Invalid numeric input."})
@@ -200,9 +221,12 @@ def admin_menu(session, user):
         print("1. Assign Room to PT Session")
         print("2. Log Equipment Issue")
         print("3. Update Equipment Status")
-        print("4. Logout")
+        print("4. View Active PT Sessions (All Clubs)" if user.chain_admin else "4. View Active PT Sessions")
+        print("5. Import Members from CSV")
+        print("6. View Scheduling Transaction Metrics")
+        print("7. Logout")
 
-        choice = input("Enter choice (1-4): ").strip()
+        choice = input("Enter choice (1-7): ").strip()
         clear_screen()
 
         if choice == '1':
@@ -237,6 +261,58 @@ def admin_menu(session, user):
                 display_result({"status": "error", "message": "Equipment ID must be an integer."})
 
         elif choice == '4':
+            print("--- Active PT Sessions (All Clubs) ---" if user.chain_admin else f"--- Active PT Sessions (Club {user.club_id}) ---")
+            result = get_active_pt_sessions_all_clubs(user)
+            if result['status'] == 'success':
+                sessions = result['sessions']
+                if sessions:
+                    print(f"Found {len(sessions)} active sessions:")
+                    print("-" * 90)
+                    print(f"| {'Club':<5} | {'Slot ID':<7} | {'Member Name':<15} | {'Start Time':<20} | {'End Time':<20} |")
+                    print("-" * 90)
+                    for s in sessions:
+                        print(f"| {s['club_id']:<5} | {s['slot_id']:<7} | {s['member_name']:<15} | {s['start_time'][:19]:<20} | {s['end_time'][:19]:<20} |")
+                    print("-" * 90)
+                else:
+                    print("No active sessions booked.")
+            else:
+                print(result['message'])
+            input("\nPress Enter to return to menu...")
+            clear_screen()
+
+        elif choice == '5':
+            print("--- Import Members from CSV ---")
+            print("Expected columns: name, email, date_of_birth (YYYY-MM-DD), gender. Existing emails are updated.")
+            path = input("CSV file path: ").strip()
+            try:
+                rows = []
+                line_numbers = [] # file line of each record, so rejected rows match the CSV (line 1 is the header)
+                with open(path, newline='') as f:
+                    reader = csv.DictReader(f)
+                    for row in reader:
+                        rows.append(row)
+                        line_numbers.append(reader.line_num)
+            except OSError as e:
+                display_result({"status": "error", "message": f"Could not read {path}: {e}"})
+                continue
+            result = import_members(session, rows, row_numbers=line_numbers)
+            for rejected in result['rejected'][:20]:
+                print(f"Line {rejected['row']} ({rejected['email'] or 'no email'}): {rejected['reason']}")
+            if len(result['rejected']) > 20:
+                print(f"... and {len(result['rejected']) - 20} more rejected rows.")
+            display_result(result)
+
+        elif choice == '6':
+            print("--- Scheduling Transaction Metrics ---")
+            print(format_transaction_metrics())
+            try:
+                print(f"Written to {write_transaction_metrics()}")
+            except OSError as e:
+                print(f"Could not write the metrics file: {e}")
+            input("\nPress Enter to return to menu...")
+            clear_screen()
+
+        elif choice == '7':
             print(f"\nLogging out {user.name}...")
             break
         else:
@@ -247,8 +323,16 @@ def admin_menu(session, user):
 
 ###
 def main_menu():
-    engine = create_engine(DATABASE_URL)
-    setup_database_schema(engine)
+    for engine in primary_engines.values(): # every shard gets the same schema
+        setup_database_schema(engine)
+    # make sure every club in CLUB_SHARDS has its Club row on its shard (new clubs added to the map)
+    for club_id in CLUB_SHARDS:
+        db = get_db_session(club_id)
+        try:
+            if not db.get(Club, club_id):
+                create_club(db, f"Club {club_id}")
+        finally:
+            db.close()
     clear_screen()
     print("Welcome to the Fitness Center Management CLI!")
 
@@ -265,6 +349,15 @@ def main_menu():
             main_choice = input("Enter choice (1-3): ").strip()
             clear_screen()
 
+            if main_choice in ('1', '2'):
+                club_id = select_club()
+                if club_id is None:
+                    display_result({"status": "error", "message": "Unknown Club ID."})
+                    continue
+                # re-open the session on the chosen club's shard
+                db.close()
+                db = get_db_session(club_id)
+
             if main_choice == '1':
                 print("--- Login ---")
                 name = input("Name: ").strip()
@@ -302,6 +395,10 @@ def main_menu():
                 display_result(result)
 
             elif main_choice == '3' or main_choice.lower() == 'exit':
+                try:
+                    write_transaction_metrics() # keep the textfile current for the scraper
+                except OSError as e:
+                    print(f"Could not write the metrics file: {e}")
                 print("Exiting application. Goodbye!")
                 break
 
@@ -0,0 +1,180 @@
+from classes import *
+from routing import club_session, current_club
+import numpy as np
+import time as timer
+
+### Fitness goal evaluation (nightly job)
+# For every Active goal, looks at the member's weight and body fat history since the goal was set
+# (starting from the last measurement on or before the goal date) and computes, per target. Targets are
+# maximums, as in the check_goal_completion trigger: a target is reached once the value is at or below it.
+#   - progress: how far the latest value has moved from the baseline towards the target (0-100%)
+#   - trend: least-squares slope of the measurements per day
+#   - projected completion: when the downward trend reaches the target (None if it is rising or flat)
+# A goal with both targets uses the lower progress and the later projection; it is Completed once every
+# target it sets is reached. All of this runs as NumPy array operations over a chunk of goals at a time,
+# and the results are written back with one UPDATE per chunk. Goals without any measurements get 0% progress.
+# Run nightly with: python goals.py
+
+GOAL_CHUNK_SIZE = 20000
+# slopes smaller than this (units per day) are float noise from flat histories, not a trend
+SLOPE_EPSILON = 1e-6
+# projections further out than this are reported as no projected completion
+MAX_PROJECTION_DAYS = 3650
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+ACTIVE_GOAL_IDS_SQL = text("""
+SELECT goal_id FROM fitnessgoal
+WHERE club_id = :cid AND status = 'Active' AND goal_id > :after
+ORDER BY goal_id
+LIMIT :chunk
+""")
+
+# one row per (goal, measurement), ordered so each goal's history is a contiguous run sorted by date
+GOAL_HISTORY_SQL = text("""
+SELECT g.goal_id, g.target_body_weight, g.target_body_fat,
+       h.date - DATE '1970-01-01' AS day, h.weight, h.body_fat
+FROM fitnessgoal g
+JOIN healthmetric h ON h.member_id = g.member_id
+    AND h.date >= COALESCE(
+        (SELECT MAX(b.date) FROM healthmetric b WHERE b.member_id = g.member_id AND b.date <= g.date),
+        g.date)
+WHERE g.goal_id = ANY(:ids)
+ORDER BY g.goal_id, h.date, h.record_id
+""")
+
+# only touches goals that are still Active, so a goal the trigger completed after the chunk was read
+# is not written back to 'Active'
+UPDATE_GOALS_SQL = text("""
+UPDATE fitnessgoal g
+SET status = v.status, progress = v.progress, projected_completion = v.projected_completion
+FROM unnest(CAST(:ids AS integer[]), CAST(:statuses AS varchar[]), CAST(:progress AS float8[]), CAST(:projected AS date[]))
+    AS v(goal_id, status, progress, projected_completion)
+WHERE g.goal_id = v.goal_id AND g.status = 'Active'
+RETURNING g.status
+""")
+
+def evaluate_target(values, days, target, starts, group):
+    # values/days are per measurement row, target is per goal; returns per-goal (progress, projected_day)
+    # with progress as a 0-1 fraction (NaN if the target is set but never measured)
+    n_rows = len(values)
+    positions = np.arange(n_rows)
+    valid = ~np.isnan(values)
+
+    first_idx = np.minimum.reduceat(np.where(valid, positions, n_rows), starts)
+    last_idx = np.maximum.reduceat(np.where(valid, positions, -1), starts)
+    measured = last_idx >= 0
+    baseline = np.where(measured, values[np.minimum(first_idx, n_rows - 1)], np.nan)
+    current = np.where(measured, values[np.maximum(last_idx, 0)], np.nan)
+    last_day = np.where(measured, days[np.maximum(last_idx, 0)], np.nan)
+
+    # least-squares slope per goal; x is days since the goal's first row to keep the sums small
+    x = np.where(valid, days - days[starts][group], 0.0)
+    y = np.where(valid, values, 0.0)
+    n = np.add.reduceat(valid.astype(float), starts)
+    sum_x = np.add.reduceat(x, starts)
+    sum_y = np.add.reduceat(y, starts)
+    sum_xx = np.add.reduceat(x * x, starts)
+    sum_xy = np.add.reduceat(x * y, starts)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = n * sum_xx - sum_x ** 2
+        slope = np.where(denom > 0, (n * sum_xy - sum_x * sum_y) / denom, np.nan)
+        slope = np.where(np.abs(slope) < SLOPE_EPSILON, np.nan, slope) # flat history: no trend
+
+        # same rule as the trigger: reached once the value is at or below the target; a baseline already
+        # at or below the target that has since risen above it counts as no progress
+        reached = current <= target
+        span = baseline - target
+        progress = np.where(reached, 1.0, np.where(span > 0, (baseline - current) / np.where(span > 0, span, 1.0), 0.0))
+        progress = np.where(measured, np.clip(progress, 0.0, 1.0), np.nan)
+
+        # only a falling trend reaches the target; a rising one gives a negative days_left
+        days_left = (target - current) / slope
+        days_left = np.where(reached, 0.0, np.where((days_left > 0) & (days_left <= MAX_PROJECTION_DAYS), days_left, np.nan))
+    projected_day = last_day + np.ceil(days_left)
+    return progress, projected_day
+
+def evaluate_goal_batch(goal_ids, target_weight, target_fat, days, weight, body_fat):
+    # Inputs are per measurement row (goal columns repeated), sorted by goal then date.
+    # Returns per goal: ids, statuses, progress (percent or None), projected completion (date or None).
+    _, starts, counts = np.unique(goal_ids, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(len(starts)), counts)
+
+    combined_progress = np.full(len(starts), np.inf)
+    combined_projection = np.full(len(starts), -np.inf)
+    has_target = np.zeros(len(starts), dtype=bool)
+
+    for values, targets in ((weight, target_weight), (body_fat, target_fat)):
+        target = targets[starts]
+        applies = ~np.isnan(target)
+        progress, projected_day = evaluate_target(values, days, target, starts, group)
+        progress = np.where(np.isnan(progress), 0.0, progress) # a target that was never measured has no progress yet
+
+        combined_progress = np.where(applies, np.minimum(combined_progress, progress), combined_progress)
+        # np.maximum propagates NaN, so one unprojectable target makes the whole goal unprojectable
+        combined_projection = np.where(applies, np.maximum(combined_projection, projected_day), combined_projection)
+        has_target |= applies
+
+    completed = has_target & (combined_progress >= 1.0)
+    statuses = np.where(completed, 'Completed', 'Active')
+    progress_pct = np.where(has_target, np.round(combined_progress * 100, 1), np.nan)
+
+    projectable = has_target & np.isfinite(combined_projection)
+    projected_dates = np.full(len(starts), None, dtype=object)
+    projected_dates[projectable] = (EPOCH + combined_projection[projectable].astype('timedelta64[D]')).astype(object)
+
+    progress_values = np.where(np.isnan(progress_pct), None, progress_pct.astype(object))
+    return goal_ids[starts].tolist(), statuses.tolist(), progress_values.tolist(), projected_dates.tolist()
+
+def evaluate_goals(session, chunk_size=GOAL_CHUNK_SIZE):
+    # Evaluates every Active goal of the session's club, chunk_size goals per query/update round trip
+    club_id = current_club(session)
+    evaluated = 0
+    completed = 0
+    after = 0
+
+    try:
+        while True:
+            chunk_ids = session.execute(ACTIVE_GOAL_IDS_SQL, {"cid": club_id, "after": after, "chunk": chunk_size}).scalars().all()
+            if not chunk_ids:
+                break
+            after = chunk_ids[-1]
+
+            rows = session.execute(GOAL_HISTORY_SQL, {"ids": chunk_ids}).fetchall()
+            ids, statuses, progress, projected = [], [], [], []
+            if rows:
+                goal_ids, target_weight, target_fat, days, weight, body_fat = (np.array(column, dtype=float) for column in zip(*rows))
+                ids, statuses, progress, projected = evaluate_goal_batch(
+                    goal_ids.astype(np.int64), target_weight, target_fat, days, weight, body_fat
+                )
+
+            # goals with no measurements yet have no history rows: record them as 0% with no projection
+            unmeasured = sorted(set(chunk_ids) - set(ids))
+            ids += unmeasured
+            statuses += ['Active'] * len(unmeasured)
+            progress += [0.0] * len(unmeasured)
+            projected += [None] * len(unmeasured)
+
+            updated = session.execute(UPDATE_GOALS_SQL, {"ids": ids, "statuses": statuses, "progress": progress, "projected": projected}).scalars().all()
+            evaluated += len(updated)
+            completed += updated.count('Completed')
+            session.commit()
+
+        return {"status": "success", "message": f"Club {club_id}: evaluated {evaluated} active goals, {completed} newly completed."}
+
+    except Exception as e:
+        session.rollback()
+        return {"status": "error", "message": f"Goal evaluation failed for club {club_id}: {e}"}
+
+def run_nightly_evaluation():
+    for club_id in CLUB_SHARDS:
+        session = club_session(club_id)
+        try:
+            start = timer.perf_counter()
+            result = evaluate_goals(session)
+            print(f"{result['message']} ({timer.perf_counter() - start:.1f}s)")
+        finally:
+            session.close()
+
+if __name__ == '__main__':
+    run_nightly_evaluation()
@@ -1,20 +1,84 @@
 from classes import *
+from routing import read_only, current_club, fan_out
+from transactions import run_serializable, TransactionAborted
+from sqlalchemy import bindparam, literal_column, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError
+
+### Cached statements for hot paths
+# Built once at import with bindparam() placeholders; each call only supplies the parameter values, so there is
+# no per-call statement construction and the engine's compiled cache is hit directly.
+# (lambda_stmt() was measured slower than both this and plain select() here, see bench_statements.py.)
+AVAILABLE_SLOT_STMT = select(AvailableTime).where(
+    AvailableTime.club_id == bindparam('club_id'),
+    AvailableTime.trainer_id == bindparam('trainer_id'),
+    AvailableTime.date == bindparam('slot_date'),
+    AvailableTime.start_time == bindparam('start_time'),
+    AvailableTime.member_id.is_(None) # slot is available if member_id is NULL
+)
+
+ROOM_CLASH_STMT = select(SchedulePT).join(AvailableTime).where(
+    SchedulePT.room_id == bindparam('room_id'),
+    AvailableTime.date == bindparam('slot_date'),
+    AvailableTime.start_time == bindparam('start_time'),
+)
+
+# parsed once at import instead of on every call
+ACTIVE_PT_SESSIONS_SQL = text("SELECT slot_id, member_name, trainer_name, start_time, end_time, status FROM ActivePTSessions WHERE club_id = :cid AND trainer_id = :tid")
+CLUB_PT_SESSIONS_SQL = text("SELECT club_id, slot_id, member_name, trainer_name, start_time, end_time, status FROM ActivePTSessions WHERE club_id = ANY(:cids)")
+
+def pt_session_rows_to_dicts(results):
+    session_list = []
+    for row in results:
+        # Row structure: slot_id, member_name, trainer_name, start_time, end_time, status
+        start_time_str = row[3].isoformat() if row[3] else None
+        end_time_str = row[4].isoformat() if row[4] else None
+
+        session_list.append({
+            'slot_id': row[0],
+            'member_name': row[1],
+            'trainer_name': row[2],
+            'start_time': start_time_str,
+            'end_time': end_time_str,
+            'status': row[5]
+        })
+    return session_list
+
+def is_unique_violation(error):
+    # psycopg (v3) exposes the SQLSTATE as .sqlstate, psycopg2 as .pgcode; 23505 is unique_violation
+    orig = getattr(error, 'orig', None)
+    return (getattr(orig, 'sqlstate', None) or getattr(orig, 'pgcode', None)) == '23505'
+
+### Club functions
+def create_club(session, name):
+    # creates the Club row for the session's club on that club's shard; the club must already be in CLUB_SHARDS
+    club_id = current_club(session)
+    if session.get(Club, club_id):
+        return {"status": "error", "message": f"Club {club_id} already exists."}
+    session.add(Club(club_id=club_id, name=name))
+    session.commit()
+    return {"status": "success", "message": f"Club {club_id} ({name}) created on shard '{CLUB_SHARDS[club_id]}'."}
 
 ### Member functions
 # 1.User Registration
 def register_new_member(session, name, email, dob_str, gender):
+    club_id = current_club(session)
+    if not session.get(Club, club_id):
+        return {"status": "error", "message": f"Registration failed: Club {club_id} has not been set up on its database yet."}
     try:
         dob = datetime.strptime(dob_str, '%Y-%m-%d').date()
-        new_member = Member(name=name, email=email, date_of_birth=dob, gender=gender)
+        new_member = Member(club_id=club_id, name=name, email=email, date_of_birth=dob, gender=gender)
         session.add(new_member)
         session.commit()
         return {"status": "success", "message": f"Member {name} registered successfully with ID: {new_member.member_id}"}
     except ValueError:
         session.rollback()
         return {"status": "error", "message": "Invalid date format. Use YYYY-MM-DD."}
-    except IntegrityError: # Catch IntegrityError for constraint violations (like unique email)
+    except IntegrityError as e: # Catch IntegrityError for constraint violations (like unique email)
         session.rollback()
-        return {"status": "error", "message": f"Registration failed: The email address '{email}' is already in use. Please use a different email."}
+        if is_unique_violation(e):
+            return {"status": "error", "message": f"Registration failed: The email address '{email}' is already in use. Please use a different email for this club."}
+        return {"status": "error", "message": f"Registration failed due to a constraint violation: {e.orig}"}
     except Exception as e:
         session.rollback()
         return {"status": "error", "message": f"An unexpected error occurred during registration: {e}"}
@@ -22,7 +86,7 @@ def register_new_member(session, name, email, dob_str, gender):
 # 2.Profile Management
 def update_member_profile(session, member_id, **kwargs):
     member = session.get(Member, member_id)
-    if not member:
+    if not member or member.club_id != current_club(session):
         return {"status": "error", "message": f"Member ID {member_id} not found."}
 
     # Handle date conversion for date_of_birth string input
@@ -34,7 +98,7 @@ def update_member_profile(session, member_id, **kwargs):
             return {"status": "error", "message": "Invalid date format for date_of_birth. Use YYYY-MM-DD."}
 
     for key, value in kwargs.items():
-        if hasattr(member, key) and key not in ['member_id']:
+        if hasattr(member, key) and key not in ['member_id', 'club_id']:
             setattr(member, key, value)
     try:
         session.commit()
@@ -42,11 +106,12 @@ def update_member_profile(session, member_id, **kwargs):
     except Exception as e:
         session.rollback()
         if 'duplicate key value violates unique constraint' in str(e):
-            return {"status": "error", "message": "Update failed: The new email address is already in use by another member."}
+            return {"status": "error", "message": "Update failed: The new email address is already in use by another member of this club."}
         return {"status": "error", "message": f"An unexpected error occurred during update: {e}"}
 
 def set_member_fitness_goal(session, member_id, target_weight, target_fat, status='Active'):
     new_goal = FitnessGoal(
+        club_id=current_club(session),
         member_id=member_id,
         target_body_weight=target_weight,
         target_body_fat=target_fat,
@@ -58,12 +123,14 @@ def set_member_fitness_goal(session, member_id, target_weight, target_fat, statu
     return {"status": "success", "message": f"New fitness goal set for member {member_id}."}
 
 # 3.Health History
-def log_health_metric(session, member_id, weight, height, heart_rate):
+def log_health_metric(session, member_id, weight, height, heart_rate, body_fat=None):
     new_metric = HealthMetric(
+        club_id=current_club(session),
         member_id=member_id,
         weight=weight,
         height=height,
         heart_rate=heart_rate,
+        body_fat=body_fat,
         date=date.today()
     )
     session.add(new_metric)
@@ -83,32 +150,38 @@ def book_pt_session(session, member_id, trainer_id, date_str, start_hour):
     except ValueError:
         return {"status": "error", "message": "Invalid date format (Use YYYY-MM-DD) or start_hour (Must be integer)."}
 
-    # find the AVAILABLE slot using date and integer hour
-    slot_stmt = select(AvailableTime).where(
-        AvailableTime.trainer_id == trainer_id,
-        AvailableTime.date == slot_date,
-        AvailableTime.start_time == start_time_int,
-        AvailableTime.member_id.is_(None) # slot is available if member_id is NULL
-    )
-    available_slot = session.execute(slot_stmt).scalar_one_or_none()
+    club_id = current_club(session)
 
-    if not available_slot:
-        return {"status": "error", "message": f"Trainer {trainer_id} is not available on {date_str} at {start_time_int:02d}:00 for a 1-hour session, or the slot is already booked."}
+    def book(session):
+        member = session.get(Member, member_id)
+        if not member or member.club_id != club_id:
+            return {"status": "error", "message": f"Member ID {member_id} does not exist in this club."}
+
+        # find the AVAILABLE slot using date and integer hour
+        available_slot = session.execute(AVAILABLE_SLOT_STMT, {
+            "club_id": club_id, "trainer_id": trainer_id, "slot_date": slot_date, "start_time": start_time_int
+        }).scalar_one_or_none()
+
+        if not available_slot:
+            return {"status": "error", "message": f"Trainer {trainer_id} is not available on {date_str} at {start_time_int:02d}:00 for a 1-hour session, or the slot is already booked."}
 
-    try:
         # book the slot in AvailableTime (setting member_id books it)
         available_slot.member_id = member_id
         # add new slot_id to SchedulePT for admin to assign room
         existing_sched = session.get(SchedulePT, available_slot.slot_id)
         if not existing_sched:
-            new_sched = SchedulePT(slot_id=available_slot.slot_id, room_id=None)
+            new_sched = SchedulePT(slot_id=available_slot.slot_id, club_id=club_id, room_id=None)
             session.add(new_sched)
-        session.commit()
+        session.flush()
 
         return {"status": "success", "message": f"PT session booked for member {member_id} with Trainer {trainer_id} on {date_str} at {start_time_int:02d}:00 (Slot ID: {available_slot.slot_id}). Room assignment pending."}
 
+    # SERIALIZABLE so two members cannot book the same slot concurrently
+    try:
+        return run_serializable(session, 'book_pt_session', book)
+    except TransactionAborted as e:
+        return {"status": "error", "message": f"Booking failed: {e} Please try again."}
     except Exception as e:
-        session.rollback()
         return {"status": "error", "message": f"Booking failed due to a database error: {e}"}
 
 
@@ -128,80 +201,69 @@ def set_trainer_availability(session, trainer_id, date_str, start_hour, weekly=F
     except ValueError:
         return {"status": "error", "message": "Invalid date format (Use YYYY-MM-DD) or start_hour (Must be integer)."}
 
-    slots_added = 0
     total_slots = 5 if weekly else 1
 
-    results = []
-    new_slot = None
-
-    for i in range(total_slots):
-        slot_date = start_date + timedelta(weeks=i)
-
-        # check for existing slots starting at the same hour on this date
-        overlap = session.query(AvailableTime).filter(
-            AvailableTime.trainer_id == trainer_id,
-            AvailableTime.date == slot_date,
-            AvailableTime.start_time == start_time_int
-        ).first()
-
-        if overlap:
-            results.append(f"Overlap detected: Slot for {slot_date} at {start_time_int:02d}:00 already exists.")
-            continue # skip adding this slot but continue loop
-
-        # add the new slot
-        new_slot = AvailableTime(
-            trainer_id=trainer_id,
-            date=slot_date,
-            start_time=start_time_int,
-            member_id=None
-        )
-        session.add(new_slot)
-        slots_added += 1
-        results.append(f"Slot added for {slot_date} (ID: {new_slot.slot_id if new_slot.slot_id else 'pending'})") # slot_id might be pending commit
+    def add_slots(session):
+        slots_added = 0
+        results = []
+        new_slot = None
+
+        for i in range(total_slots):
+            slot_date = start_date + timedelta(weeks=i)
+
+            # check for existing slots starting at the same hour on this date
+            overlap = session.query(AvailableTime).filter(
+                AvailableTime.trainer_id == trainer_id,
+                AvailableTime.date == slot_date,
+                AvailableTime.start_time == start_time_int
+            ).first()
+
+            if overlap:
+                results.append(f"Overlap detected: Slot for {slot_date} at {start_time_int:02d}:00 already exists.")
+                continue # skip adding this slot but continue loop
+
+            # add the new slot
+            new_slot = AvailableTime(
+                club_id=current_club(session),
+                trainer_id=trainer_id,
+                date=slot_date,
+                start_time=start_time_int,
+                member_id=None
+            )
+            session.add(new_slot)
+            session.flush() # assigns slot_id
+            slots_added += 1
+            results.append(f"Slot added for {slot_date} (ID: {new_slot.slot_id})")
+
+        if weekly:
+            if slots_added == total_slots:
+                return {"status": "success", "message": f"Weekly availability set for trainer {trainer_id}. {slots_added} sessions added starting from {date_str}."}
+            else:
+                return {"status": "success", "message": f"Weekly availability attempted for trainer {trainer_id}. {slots_added} of {total_slots} sessions added. \nDetails:\n {'\n'.join(results)}"}
+        else:
+            if slots_added == 1:
+                return {"status": "success", "message": f"Availability set for trainer {trainer_id} on {date_str} at {start_time_int:02d}:00 (Slot ID: {new_slot.slot_id})."}
+            else:
+                # This handles the case where the single slot was an overlap or other error
+                return {"status": "error", "message": f"Failed to add single slot for trainer {trainer_id}. Reason: {results[0] if results else 'Unknown error.'}"}
 
+    # SERIALIZABLE so the overlap check and the insert cannot interleave with another request for the same slot
     try:
-        session.commit()
+        return run_serializable(session, 'set_trainer_availability', add_slots)
+    except TransactionAborted as e:
+        return {"status": "error", "message": f"Setting availability failed: {e} Please try again."}
     except Exception as e:
-        session.rollback()
         return {"status": "error", "message": f"Database error during commit: {e}"}
 
-    if weekly:
-        if slots_added == total_slots:
-            return {"status": "success", "message": f"Weekly availability set for trainer {trainer_id}. {slots_added} sessions added starting from {date_str}."}
-        else:
-            return {"status": "success", "message": f"Weekly availability attempted for trainer {trainer_id}. {slots_added} of {total_slots} sessions added. \nDetails:\n {'\n'.join(results)}"}
-    else:
-        if slots_added == 1:
-            return {"status": "success", "message": f"Availability set for trainer {trainer_id} on {date_str} at {start_time_int:02d}:00 (Slot ID: {new_slot.slot_id})."}
-        else:
-            # This handles the case where the single slot was an overlap or other error
-            return {"status": "error", "message": f"Failed to add single slot for trainer {trainer_id}. Reason: {results[0] if results else 'Unknown error.'}"}
-
 # 2. Schedule View
 def get_active_pt_sessions(session, trainer_id):
     # fetches all booked PT sessions for a specific trainer using the ActivePTSessions View
     try:
-        view_query = text("SELECT slot_id, member_name, trainer_name, start_time, end_time, status FROM ActivePTSessions WHERE trainer_id = :tid")
+        # Execute the query, passing the trainer_id as a parameter (served by a replica when one is healthy)
+        with read_only(session):
+            results = session.execute(ACTIVE_PT_SESSIONS_SQL, {"cid": current_club(session), "tid": trainer_id}).fetchall()
 
-        # Execute the query, passing the trainer_id as a parameter
-        results = session.execute(view_query, {"tid": trainer_id}).fetchall()
-
-        session_list = []
-        for row in results:
-            # Row structure: slot_id, member_name, trainer_name, start_time, end_time, status
-            start_time_str = row[3].isoformat() if row[3] else None
-            end_time_str = row[4].isoformat() if row[4] else None
-
-            session_list.append({
-                'slot_id': row[0],
-                'member_name': row[1],
-                'trainer_name': row[2],
-                'start_time': start_time_str,
-                'end_time': end_time_str,
-                'status': row[5]
-            })
-
-        return {"status": "success", "sessions": session_list}
+        return {"status": "success", "sessions": pt_session_rows_to_dicts(results)}
 
     except Exception as e:
         session.rollback()
@@ -211,9 +273,11 @@ def get_active_pt_sessions(session, trainer_id):
 ### Administrative Staff Functions
 # 1. Room Booking
 def assign_room_for_session(session, slot_id, room_id):
-    try:
+    club_id = current_club(session)
+
+    def assign(session):
         booked_slot = session.get(SchedulePT, slot_id)
-        if not booked_slot:
+        if not booked_slot or booked_slot.club_id != club_id:
             return {"status": "error", "message": f"SchedulePT slot {slot_id} not found."}
 
         slot_room_id = booked_slot.room_id
@@ -223,8 +287,8 @@ def assign_room_for_session(session, slot_id, room_id):
 
         # check if room_id exists in Room table
         room_check = session.get(Room, room_id)
-        if not room_check:
-            return {"status": "error", "message": f"Room ID {room_id} does not exist in the database."}
+        if not room_check or room_check.club_id != club_id:
+            return {"status": "error", "message": f"Room ID {room_id} does not exist in this club."}
 
         available_slot = session.get(AvailableTime, slot_id)
         if not available_slot:
@@ -234,28 +298,31 @@ def assign_room_for_session(session, slot_id, room_id):
         available_time = available_slot.start_time
 
         # get all booked SchedulePT slots for the day/room
-        existing_slots = session.query(SchedulePT).join(AvailableTime).filter(
-            SchedulePT.room_id == room_id,
-            AvailableTime.date == available_date,
-            AvailableTime.start_time == available_time,
-        ).all()
+        existing_slots = session.execute(ROOM_CLASH_STMT, {
+            "room_id": room_id, "slot_date": available_date, "start_time": available_time
+        }).scalars().all()
 
         # check if room_id is already booked at the date/time
         if existing_slots:
             return {"status": "error", "message": f"Room {room_id} is not AVAILABLE at {available_time} on {available_date}."}
 
         booked_slot.room_id = room_id
-        session.commit()
+        session.flush()
 
         return {"status": "success", "message": f"Room {room_id} is AVAILABLE for booking at {available_time} on {available_date}."}
 
-    except Exception as e:
-        session.rollback()
+    # SERIALIZABLE so two admins cannot both pass the clash check for the same room and hour
+    try:
+        return run_serializable(session, 'assign_room_for_session', assign)
+    except TransactionAborted as e:
+        return {"status": "error", "message": f"Room assignment failed: {e} Please try again."}
+    except DBAPIError as e:
         return {"status": "error", "message": f"Database error while assigning room: {e}"}
 
 # 2. Equipment Management
 def log_equipment_issue(session, equipment_id, room_id, issue):
     new_issue = EquipmentMaintain(
+        club_id=current_club(session),
         equipment_id=equipment_id,
         room_id=room_id,
         issue=issue,
@@ -267,9 +334,151 @@ def log_equipment_issue(session, equipment_id, room_id, issue):
 
 def update_equipment_status(session, equipment_id, new_status):
     equipment = session.get(EquipmentMaintain, equipment_id)
-    if not equipment:
+    if not equipment or equipment.club_id != current_club(session):
         return {"status": "error", "message": f"Equipment ID {equipment_id} not found."}
 
     equipment.status = new_status
     session.commit()
     return {"status": "success", "message": f"Status for equipment {equipment_id} updated to: {new_status}."}
+
+# 3. Member Import
+IMPORT_BATCH_SIZE = 1000
+
+def parse_member_rows(rows, row_numbers=None):
+    # Validates the whole roster up front. Returns (valid, rejected) where valid holds
+    # (row_number, values) pairs; row numbers are 1-based positions in rows unless row_numbers
+    # gives one label per row (e.g. the CSV line each record came from).
+    valid = []
+    rejected = []
+    parsed_dates = {} # rosters repeat birth dates a lot, so each distinct string is parsed once
+    seen_emails = set()
+
+    if row_numbers is None:
+        row_numbers = range(1, len(rows) + 1)
+
+    for row_number, row in zip(row_numbers, rows):
+        name = (row.get('name') or '').strip()
+        email = (row.get('email') or '').strip()
+        dob_str = (row.get('date_of_birth') or '').strip()
+        gender = (row.get('gender') or '').strip() or None
+
+        if not name or not email:
+            rejected.append({'row': row_number, 'email': email, 'reason': "Name and email are required."})
+            continue
+        if email in seen_emails:
+            rejected.append({'row': row_number, 'email': email, 'reason': "Duplicate email earlier in the import."})
+            continue
+
+        dob = None
+        if dob_str:
+            if dob_str not in parsed_dates:
+                try:
+                    parsed_dates[dob_str] = datetime.strptime(dob_str, '%Y-%m-%d').date()
+                except ValueError:
+                    parsed_dates[dob_str] = None
+            dob = parsed_dates[dob_str]
+            if dob is None:
+                rejected.append({'row': row_number, 'email': email, 'reason': "Invalid date format. Use YYYY-MM-DD."})
+                continue
+
+        seen_emails.add(email)
+        valid.append((row_number, {'name': name, 'email': email, 'date_of_birth': dob, 'gender': gender}))
+
+    return valid, rejected
+
+def member_upsert_stmt(club_id, values_list):
+    stmt = pg_insert(Member).values([dict(values, club_id=club_id) for values in values_list])
+    return stmt.on_conflict_do_update(
+        index_elements=[Member.club_id, Member.email],
+        set_={
+            'name': stmt.excluded.name,
+            # blank optional cells keep the member's stored value instead of overwriting it with NULL
+            'date_of_birth': func.coalesce(stmt.excluded.date_of_birth, Member.date_of_birth),
+            'gender': func.coalesce(stmt.excluded.gender, Member.gender),
+        }
+    ).returning(
+        Member.member_id,
+        Member.email,
+        literal_column('xmax = 0').label('inserted') # xmax is 0 only for freshly inserted row versions
+    )
+
+def upsert_member_rows(session, club_id, batch):
+    # Upserts batch ((row_number, values) pairs) inside a savepoint. If the database rejects it, the batch is
+    # split in halves and retried, so only the rows that actually fail are rejected, each with its own error.
+    # Returns (results, rejected) where results are RETURNING rows.
+    try:
+        with session.begin_nested():
+            return session.execute(member_upsert_stmt(club_id, [values for _, values in batch])).fetchall(), []
+    except DBAPIError as e:
+        if len(batch) == 1:
+            row_number, values = batch[0]
+            return [], [{'row': row_number, 'email': values['email'], 'reason': f"Database error: {e.orig}"}]
+    middle = len(batch) // 2
+    first_results, first_rejected = upsert_member_rows(session, club_id, batch[:middle])
+    second_results, second_rejected = upsert_member_rows(session, club_id, batch[middle:])
+    return first_results + second_results, first_rejected + second_rejected
+
+def import_members(session, rows, batch_size=IMPORT_BATCH_SIZE, row_numbers=None):
+    # Bulk insert/update members keyed on (club, email) using INSERT ... ON CONFLICT DO UPDATE ... RETURNING,
+    # one statement and one commit per batch. rows are dicts with name, email, date_of_birth (YYYY-MM-DD), gender;
+    # date_of_birth and gender may be blank, in which case an existing member keeps their current value.
+    # row_numbers optionally labels each row in the report (see parse_member_rows).
+    club_id = current_club(session)
+    valid, rejected = parse_member_rows(rows, row_numbers)
+    inserted = []
+    updated = []
+
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        batch_row_numbers = {values['email']: row_number for row_number, values in batch}
+
+        try:
+            results, batch_rejected = upsert_member_rows(session, club_id, batch)
+            session.commit()
+        except DBAPIError as e: # e.g. the connection dropped, not a per-row problem
+            session.rollback()
+            reason = f"Database error in batch: {e.orig}"
+            rejected.extend({'row': row_number, 'email': values['email'], 'reason': reason} for row_number, values in batch)
+            continue
+
+        rejected.extend(batch_rejected)
+        for member_id, email, was_inserted in results:
+            entry = {'row': batch_row_numbers[email], 'email': email, 'member_id': member_id}
+            (inserted if was_inserted else updated).append(entry)
+
+    rejected.sort(key=lambda r: r['row'])
+    return {
+        "status": "success" if not rejected else "error" if not inserted and not updated else "partial",
+        "message": f"Member import: {len(inserted)} inserted, {len(updated)} updated, {len(rejected)} rejected.",
+        "inserted": inserted,
+        "updated": updated,
+        "rejected": rejected,
+    }
+
+# 4. Cross-Club Reporting
+def get_active_pt_sessions_all_clubs(admin, club_ids=None):
+    # fans the ActivePTSessions query out to every shard in parallel (one query per shard) and merges the results.
+    # Only chain admins see other clubs; a club admin only gets their own club's sessions.
+    if not admin.chain_admin:
+        if club_ids is not None and set(club_ids) != {admin.club_id}:
+            return {"status": "error", "message": "Only chain admins can view other clubs' PT sessions."}
+        club_ids = [admin.club_id]
+
+    try:
+        per_shard = fan_out(
+            lambda session, shard_club_ids: session.execute(CLUB_PT_SESSIONS_SQL, {"cids": shard_club_ids}).fetchall(),
+            club_ids
+        )
+
+        session_list = []
+        for results in per_shard:
+            # Row structure: club_id, then the ActivePTSessions columns
+            for row, pt_session in zip(results, pt_session_rows_to_dicts([row[1:] for row in results])):
+                pt_session['club_id'] = row[0]
+                session_list.append(pt_session)
+        session_list.sort(key=lambda s: (s['start_time'] or '', s['club_id'], s['slot_id']))
+
+        return {"status": "success", "sessions": session_list}
+
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to retrieve PT sessions across clubs: {e}"}
@@ -0,0 +1,76 @@
+from goals import *
+from datetime import date
+
+nan = np.nan
+
+def run_batch(goal_ids, days, weight, target_weight, body_fat=None, target_fat=None):
+    n = len(goal_ids)
+    return evaluate_goal_batch(
+        np.array(goal_ids, dtype=np.int64),
+        np.array(target_weight, dtype=float),
+        np.array(target_fat if target_fat is not None else [nan] * n, dtype=float),
+        np.array(days, dtype=float),
+        np.array(weight, dtype=float),
+        np.array(body_fat if body_fat is not None else [nan] * n, dtype=float),
+    )
+
+def test_progress_and_projection_for_steady_loss():
+    ids, statuses, progress, projected = run_batch([1, 1, 1], [0, 10, 20], [80, 78, 76], [70, 70, 70])
+    assert ids == [1]
+    assert statuses == ['Active']
+    assert progress == [40.0]
+    assert projected == [date(1970, 2, 20)] # -0.2 kg/day from day 20, 6 kg to go
+
+def test_flat_history_has_no_projection():
+    ids, statuses, progress, projected = run_batch([1, 1, 1, 1], [0, 7, 14, 21], [80.3, 80.3, 80.3, 80.3], [70] * 4)
+    assert statuses == ['Active']
+    assert progress == [0.0]
+    assert projected == [None]
+
+def test_many_random_flat_histories_only_produce_dates_or_none():
+    rng = np.random.default_rng(0)
+    goals, readings = 20000, 4
+    goal_ids = np.repeat(np.arange(goals), readings)
+    days = np.tile(np.arange(readings) * 7.0, goals) + np.repeat(rng.integers(19000, 20000, goals), readings)
+    weight = np.repeat(np.round(rng.uniform(50, 120, goals), 1), readings)
+    target = np.repeat(np.round(rng.uniform(50, 120, goals), 1), readings)
+
+    _, _, _, projected = run_batch(goal_ids, days, weight, target)
+    assert all(p is None or isinstance(p, date) for p in projected)
+
+def test_projection_beyond_horizon_is_dropped():
+    # 0.001 kg/day with 10 kg to go is ~27 years away
+    ids, statuses, progress, projected = run_batch([1, 1], [0, 100], [80, 79.9], [70, 70])
+    assert projected == [None]
+
+def test_goal_completes_only_when_every_target_is_reached():
+    _, statuses, progress, _ = run_batch(
+        [1, 1, 2, 2], [0, 7, 0, 7], [72, 69, 72, 69], [70] * 4,
+        body_fat=[22, 19.5, 22, 21], target_fat=[20] * 4
+    )
+    assert statuses == ['Completed', 'Active']
+    assert progress == [100.0, 50.0]
+
+def test_unmeasured_body_fat_target_blocks_completion():
+    _, statuses, progress, projected = run_batch([1, 1], [0, 7], [72, 69], [70, 70], target_fat=[20, 20])
+    assert statuses == ['Active']
+    assert progress == [0.0]
+    assert projected == [None]
+
+def test_baseline_below_target_that_rises_above_is_not_completed():
+    # the trigger treats targets as maximums, so 71 kg against a 70 kg target is not reached
+    _, statuses, progress, projected = run_batch([1, 1, 1], [0, 7, 14], [68, 69.5, 71], [70] * 3)
+    assert statuses == ['Active']
+    assert progress == [0.0]
+    assert projected == [None]
+
+def test_baseline_below_target_that_stays_below_is_completed():
+    _, statuses, progress, _ = run_batch([1, 1], [0, 7], [68, 69], [70, 70])
+    assert statuses == ['Completed']
+    assert progress == [100.0]
+
+def test_rising_trend_has_no_projection():
+    _, statuses, progress, projected = run_batch([1, 1, 1], [0, 7, 14], [80, 81, 82], [70] * 3)
+    assert statuses == ['Active']
+    assert progress == [0.0]
+    assert projected == [None]
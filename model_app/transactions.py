@@ -0,0 +1,102 @@
+from sqlalchemy.exc import DBAPIError
+from threading import Lock
+import os
+import random
+import time as timer
+
+### Serializable transactions with retry
+# Scheduling writes (room assignment, availability, booking) check for a clash and then write in the same
+# transaction. At READ COMMITTED two admins can both pass the check; at SERIALIZABLE PostgreSQL aborts one
+# of them with a serialization failure instead, and run_serializable() retries it with jittered backoff.
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 0.01
+BACKOFF_CAP_SECONDS = 0.5
+
+# SQLSTATEs worth retrying: serialization_failure and deadlock_detected
+RETRYABLE_SQLSTATES = ('40001', '40P01')
+
+# Prometheus textfile written by write_transaction_metrics(); point node_exporter's
+# --collector.textfile.directory at its directory to scrape it
+METRICS_TEXTFILE = "scheduling_metrics.prom"
+
+class TransactionAborted(Exception):
+    # raised when a transaction still fails with a serialization error after MAX_ATTEMPTS
+    pass
+
+# operation name -> {'commits': n, 'retries': n, 'aborts': n, 'errors': n}
+_metrics = {}
+_metrics_lock = Lock()
+
+def _count(name, counter):
+    with _metrics_lock:
+        counters = _metrics.setdefault(name, {'commits': 0, 'retries': 0, 'aborts': 0, 'errors': 0})
+        counters[counter] += 1
+
+def get_transaction_metrics():
+    # snapshot of the retry/abort counters per operation
+    with _metrics_lock:
+        return {name: dict(counters) for name, counters in _metrics.items()}
+
+def format_transaction_metrics():
+    # Prometheus text exposition format, e.g. for a /metrics endpoint or a node_exporter textfile
+    lines = ["# TYPE scheduling_transactions_total counter"]
+    for name, counters in sorted(get_transaction_metrics().items()):
+        for counter, value in sorted(counters.items()):
+            lines.append(f'scheduling_transactions_total{{operation="{name}",outcome="{counter}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def write_transaction_metrics(path=METRICS_TEXTFILE):
+    # written to a temporary file and renamed, so a scraper never reads a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(format_transaction_metrics())
+    os.replace(tmp_path, path)
+    return path
+
+def reset_transaction_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+def is_retryable(error):
+    # psycopg (v3) exposes the SQLSTATE as .sqlstate, psycopg2 as .pgcode
+    orig = getattr(error, 'orig', None)
+    sqlstate = getattr(orig, 'sqlstate', None) or getattr(orig, 'pgcode', None)
+    return sqlstate in RETRYABLE_SQLSTATES
+
+def backoff_delay(attempt):
+    # "full jitter": random delay up to an exponentially growing cap, so retrying admins spread out
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def run_serializable(session, name, work, max_attempts=MAX_ATTEMPTS):
+    # Runs work(session) in a SERIALIZABLE transaction and commits it if it returns a success result,
+    # otherwise rolls it back. Serialization failures/deadlocks are retried; other errors are re-raised.
+    # work must not commit itself and must be safe to run again from scratch.
+    for attempt in range(max_attempts):
+        # the isolation level can only be set when a transaction starts; operations commit their own
+        # writes, so anything still open here is a leftover read transaction
+        if session.in_transaction():
+            session.rollback()
+        session.connection(execution_options={"isolation_level": "SERIALIZABLE"})
+        try:
+            result = work(session)
+            if result.get('status') == 'success':
+                session.commit()
+                _count(name, 'commits')
+            else:
+                session.rollback()
+            return result
+        except DBAPIError as e:
+            session.rollback()
+            if not is_retryable(e):
+                _count(name, 'errors')
+                raise
+            if attempt + 1 == max_attempts:
+                _count(name, 'aborts')
+                raise TransactionAborted(f"{name} aborted after {max_attempts} attempts due to concurrent updates.") from e
+            _count(name, 'retries')
+            timer.sleep(backoff_delay(attempt))
+        except Exception:
+            session.rollback()
+            _count(name, 'errors')
+            raise